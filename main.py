@@ -1,24 +1,39 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.db.db import get_client, DB_NAME
+from fastapi.responses import ORJSONResponse
+from src.db.db import get_client, ensure_indexes, check_unique_indexes, use_index_hints, CREATE_INDEXES, DB_NAME
+from src.repositories.book_repository import BookRepository
+from src.repositories.user_repostory import UserRepository
 from src.routes import book_routes as books_rts
 from src.routes import user_routes as users_rts
+from src.services.book_service import BookService
+from src.services.user_service import UserService
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup ---
-    client = await get_client()
+    client = get_client()
     app.state.client = client
     app.state.db = client[DB_NAME]
-    # Si necesitas inicializar índices, colas, etc., hazlo aquí
+    if CREATE_INDEXES:
+        await ensure_indexes(app.state.db)
+    else:
+        # Las reglas de duplicados dependen de los índices únicos: sin ellos, no arrancar
+        await check_unique_indexes(app.state.db)
+    # Repos y servicios no guardan estado por request: se crean una sola vez
+    app.state.book_service = BookService(
+        BookRepository(app.state.db, use_filter_hint=await use_index_hints(app.state.db))
+    )
+    app.state.user_service = UserService(UserRepository(app.state.db))
     yield
     # --- Shutdown ---
-    # Cierra recursos aquí si aplica (ej., cerrar cliente de DB)
-    # await app.state.client.close()  # depende de tu driver; ajusta según tu implementación
+    app.state.client.close()
 
 app = FastAPI(
     title="My Super Library - Production enviroment",
     lifespan=lifespan,
+    # orjson serializa bastante más rápido que json de la stdlib
+    default_response_class=ORJSONResponse,
 )
 
 # Registra rutas
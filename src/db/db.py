@@ -1,25 +1,191 @@
 import os
+from typing import List, Optional, Tuple
+
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient 
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from src.utils.normalize import normalize_str
 
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME")
+# Permite desactivar la creación de índices al arrancar (ej: usuarios sin permisos de createIndex).
+# En ese caso los índices únicos deben existir igual: se verifican al arrancar.
+CREATE_INDEXES = os.getenv("CREATE_INDEXES", "true").lower() in ("1", "true", "yes")
+# Forzar (hint) books_genre_id_idx en list_books filtrado solo por genre. Solo
+# se aplica si el índice existe al arrancar (ver use_index_hints).
+USE_INDEX_HINTS = os.getenv("USE_INDEX_HINTS", "true").lower() in ("1", "true", "yes")
+
+# Índice compuesto de los filtros de list_books
+BOOKS_FILTER_INDEX = "books_filter_idx"
+# genre + _id: filtro por genre que además sirve el sort por _id (el que se fuerza con hint)
+BOOKS_GENRE_INDEX = "books_genre_id_idx"
+# Índice único de libros duplicados (title + author normalizados)
+BOOKS_UNIQUE_INDEX = "books_title_author_uniq"
+# Índices únicos de los que dependen las reglas de duplicados (409) de los
+# servicios: no hay chequeo previo, así que sin ellos la regla no existe.
+REQUIRED_UNIQUE_INDEXES = {"users": "email_1", "books": BOOKS_UNIQUE_INDEX}
+
+
+def get_client(uri: Optional[str] = None) -> AsyncIOMotorClient:
+    """
+    Crea el cliente de Mongo con el pool ya afinado.
+    Se llama UNA sola vez desde el lifespan de la app (queda en app.state.client),
+    nunca por request. Los tests la usan con su propio uri (mismo pool y compresión).
+    """
+    return AsyncIOMotorClient(
+        uri or MONGO_URI,
+        maxPoolSize=200,
+        minPoolSize=20,
+        # zstd necesita el paquete zstandard; zlib viene con Python y sirve de respaldo
+        compressors="zstd,zlib",
+        serverSelectionTimeoutMS=3000,
+        waitQueueTimeoutMS=2000,
+        retryWrites=True,
+    )
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> None:
+    """
+    Crea los índices de los campos más consultados.
+    create_index es idempotente: si el índice ya existe no hace nada.
+    """
+    users = db["users"]
+    books = db["books"]
+
+    # get_user_by_email y el filtro de list_users buscan por igualdad en email
+    await users.create_index("email", unique=True, background=True)
+
+    # list_books filtra por title / author / genre (igualdad) y ordena por _id.
+    # Orden del compuesto: genre primero porque es el filtro más usado en los
+    # listados, luego author y title. Sirve las combinaciones de filtros, pero
+    # no el sort por _id (queda detrás de author/title): eso lo cubre el de abajo.
+    await books.create_index(
+        [("genre", 1), ("author", 1), ("title", 1)],
+        name=BOOKS_FILTER_INDEX,
+        background=True,
+    )
+    # Filtro solo por genre + paginación por cursor: igualdad en genre y las
+    # claves ya salen ordenadas por _id, sin sort en memoria (el caso más común)
+    await books.create_index(
+        [("genre", 1), ("_id", 1)],
+        name=BOOKS_GENRE_INDEX,
+        background=True,
+    )
+    # Filtro solo por author + paginación por cursor (sort por _id)
+    await books.create_index([("author", 1), ("_id", 1)], background=True)
+    await books.create_index("title", background=True)
+    # Un libro es duplicado si coincide title + author normalizados.
+    # Solo hay trabajo si el índice falta o es el parcial de versiones
+    # anteriores: con el índice completo ya creado, arrancar no recorre books.
+    current = (await books.index_information()).get(BOOKS_UNIQUE_INDEX)
+    if current is None or "partialFilterExpression" in current:
+        await _migrate_books_unique_index(books, drop_existing=current is not None)
+
+
+async def _migrate_books_unique_index(
+    books: AsyncIOMotorCollection, *, drop_existing: bool
+) -> None:
+    """
+    Crea books_title_author_uniq sobre TODOS los documentos (sin filtro parcial).
+    Antes completa los *_norm de los libros viejos; si aun así hay duplicados
+    (ej: libros que solo difieren en mayúsculas, que antes se permitían),
+    falla con un RuntimeError que nombra las claves en conflicto.
+    """
+    # El parcial se borra ANTES del backfill: si no, completar los *_norm de dos
+    # libros repetidos choca en él (BulkWriteError) en vez de en create_index.
+    # Además, con otras opciones create_index falla (IndexOptionsConflict).
+    if drop_existing:
+        await books.drop_index(BOOKS_UNIQUE_INDEX)
+    await _backfill_book_norm_fields(books)
+    try:
+        await books.create_index(
+            [("title_norm", 1), ("author_norm", 1)],
+            unique=True,
+            name=BOOKS_UNIQUE_INDEX,
+            background=True,
+        )
+    except OperationFailure as e:
+        collisions = await _find_books_norm_collisions(books)
+        raise RuntimeError(
+            f"No se pudo crear el índice único {BOOKS_UNIQUE_INDEX}: hay libros "
+            f"duplicados (title_norm, author_norm): {collisions}. "
+            "Resuélvelos (renombrar o borrar) antes de arrancar."
+        ) from e
+
 
-_client: AsyncIOMotorClient | None = None
+async def _backfill_book_norm_fields(books: AsyncIOMotorCollection) -> None:
+    """
+    Completa title_norm / author_norm en los libros que no tienen alguno
+    (creados antes del índice único, o con un PATCH que solo tocó uno de los dos).
+    Usa normalize_str, la misma función que arma la clave al escribir: un
+    pipeline con $trim/$toLower no coincide con str.lower() fuera de ASCII.
+    Los valores que no son str (null o ausentes, que el PATCH viejo permitía)
+    se saltan: esa clave queda en null en el índice.
+    """
+    missing = {"$or": [{"title_norm": {"$exists": False}}, {"author_norm": {"$exists": False}}]}
+    ops = []
+    async for doc in books.find(missing, projection={"title": 1, "author": 1}):
+        norm_fields = {
+            f"{field}_norm": normalize_str(doc[field])
+            for field in ("title", "author")
+            if isinstance(doc.get(field), str)
+        }
+        if not norm_fields:
+            continue
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": norm_fields}))
+        if len(ops) == 1000:
+            await books.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        await books.bulk_write(ops, ordered=False)
 
-async def get_client() -> AsyncIOMotorClient: 
 
-    global _client 
+async def _find_books_norm_collisions(
+    books: AsyncIOMotorCollection, limit: int = 10
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Claves (title_norm, author_norm) repetidas: las que impiden el índice único."""
+    pipeline = [
+        {"$group": {
+            "_id": {"title_norm": "$title_norm", "author_norm": "$author_norm"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit},
+    ]
+    groups = await books.aggregate(pipeline).to_list(length=limit)
+    return [(g["_id"].get("title_norm"), g["_id"].get("author_norm")) for g in groups]
 
-    if _client is None: 
-        _client = AsyncIOMotorClient(MONGO_URI) 
-    return _client 
 
-async def get_db(): 
+async def check_unique_indexes(db: AsyncIOMotorDatabase) -> None:
+    """
+    Con CREATE_INDEXES desactivado los índices los crea otro (ej: un DBA).
+    Si falta alguno de REQUIRED_UNIQUE_INDEXES, falla al arrancar en vez de
+    aceptar duplicados en silencio.
+    """
+    missing = []
+    for collection, name in REQUIRED_UNIQUE_INDEXES.items():
+        info = (await db[collection].index_information()).get(name)
+        if info is None or not info.get("unique"):
+            missing.append(f"{collection}.{name}")
+    if missing:
+        raise RuntimeError(
+            "Faltan índices únicos requeridos: " + ", ".join(missing)
+            + ". Créalos o arranca con CREATE_INDEXES=true."
+        )
 
-    client = await get_client() 
 
-    yield client[DB_NAME]
\ No newline at end of file
+async def use_index_hints(db: AsyncIOMotorDatabase) -> bool:
+    """
+    Decide al arrancar si list_books puede forzar books_genre_id_idx.
+    Un hint a un índice inexistente hace fallar la consulta (500 en cada
+    listado filtrado por genre), p.ej. con CREATE_INDEXES=false y el índice
+    sin crear: en ese caso no se usa aunque USE_INDEX_HINTS esté activo.
+    """
+    if not USE_INDEX_HINTS:
+        return False
+    return BOOKS_GENRE_INDEX in await db["books"].index_information()
@@ -1,11 +1,16 @@
 # src/repositories/book_repository.py
 
-from typing import List, Optional, Dict, Any
+import asyncio
+from typing import AsyncIterator, Iterable, List, Optional, Dict, Any, Tuple
 
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorCollection
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorCollection, AsyncIOMotorCursor
 
+from src.db.db import BOOKS_GENRE_INDEX
 from src.schemas.book import BookCreate, BookUpdate, BookRead
+from src.utils.normalize import normalize_str
 
 
 class BookRepository:
@@ -14,9 +19,18 @@ class BookRepository:
     SOLO maneja operaciones contra MongoDB (sin lógica de negocio).
     """
 
-    def __init__(self, db: AsyncIOMotorDatabase) -> None:
+    # Solo los campos que usa BookRead, derivados del modelo para que no se
+    # desincronicen (id sale de _id, que siempre viene por defecto).
+    _BOOK_PROJECTION: Dict[str, int] = {f: 1 for f in BookRead.model_fields if f != "id"}
+
+    # Índice (genre, _id) creado en ensure_indexes (src/db/db.py)
+    _GENRE_INDEX = BOOKS_GENRE_INDEX
+
+    def __init__(self, db: AsyncIOMotorDatabase, *, use_filter_hint: bool = False) -> None:
         # Aquí asumimos que tu colección se llama "books"
         self._collection: AsyncIOMotorCollection = db["books"]
+        # Forzar books_genre_id_idx en list_books (requiere que el índice exista)
+        self._use_filter_hint = use_filter_hint
 
     # ======================================================
     # ====================  HELPERS  =======================
@@ -28,16 +42,37 @@ class BookRepository:
         Convierte un string a ObjectId.
         Lanza ValueError si el formato no es válido (la capa de servicio decide qué hacer).
         """
-        if not ObjectId.is_valid(book_id):
+        # Un solo parseo del hex (ObjectId.is_valid + ObjectId() lo hacían dos veces)
+        try:
+            return ObjectId(book_id)
+        except (InvalidId, TypeError):
             raise ValueError(f"ID de libro inválido: {book_id}")
-        return ObjectId(book_id)
+
+    @staticmethod
+    def _with_norm_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Agrega title_norm / author_norm (normalize_str, la misma normalización
+        que usan el chequeo del alta masiva y el backfill de ensure_indexes)
+        a partir de title / author. Sobre esos campos está el índice único que
+        evita libros duplicados (ver ensure_indexes).
+        """
+        for field in ("title", "author"):
+            value = data.get(field)
+            if isinstance(value, str):
+                data[f"{field}_norm"] = normalize_str(value)
+        return data
 
     @staticmethod
     def _document_to_book_read(doc: Dict[str, Any]) -> BookRead:
         """
         Convierte un documento de MongoDB en un modelo BookRead.
+
+        Usa model_construct (sin validación): SOLO para datos que vienen de la
+        DB. Todo lo que se escribe pasa antes por los schemas: *Create exige
+        cada campo y BookUpdate rechaza null explícito, así que un campo guardado
+        nunca queda en null. Lo que llega del cliente se sigue validando.
         """
-        return BookRead(
+        return BookRead.model_construct(
             id=str(doc["_id"]),
             title=doc["title"],
             author=doc["author"],
@@ -53,15 +88,24 @@ class BookRepository:
         """
         Inserta un nuevo libro en la colección y devuelve el modelo BookRead.
         """
-        book_dict = book_in.model_dump()
+        book_dict = self._with_norm_fields(book_in.model_dump())
         result = await self._collection.insert_one(book_dict)
 
-        created = await self._collection.find_one({"_id": result.inserted_id})
-        if created is None:
-            # En teoría no debería ocurrir; la capa de servicio puede manejar este caso.
-            raise RuntimeError("Error al recuperar el libro recién creado")
+        # Ya tenemos los datos insertados: construimos el BookRead sin volver a leer.
+        book_dict["_id"] = result.inserted_id
+        return self._document_to_book_read(book_dict)
 
-        return self._document_to_book_read(created)
+    async def create_books(self, books_in: List[BookCreate]) -> List[BookRead]:
+        """
+        Inserta varios libros en un solo viaje (insert_many) y devuelve sus BookRead.
+        ordered=False: el servidor no corta el lote en el primer error.
+        """
+        book_dicts = [self._with_norm_fields(book_in.model_dump()) for book_in in books_in]
+        result = await self._collection.insert_many(book_dicts, ordered=False)
+
+        for book_dict, inserted_id in zip(book_dicts, result.inserted_ids):
+            book_dict["_id"] = inserted_id
+        return [self._document_to_book_read(book_dict) for book_dict in book_dicts]
 
     # ======================================================
     # ======================  READ  ========================
@@ -72,36 +116,112 @@ class BookRepository:
         Devuelve un libro por su ID o None si no existe.
         """
         oid = self._to_object_id(book_id)
-        doc = await self._collection.find_one({"_id": oid})
+        doc = await self._collection.find_one({"_id": oid}, projection=self._BOOK_PROJECTION)
         if doc is None:
             return None
         return self._document_to_book_read(doc)
 
+    async def exists_by_title_author(self, keys: Iterable[Tuple[str, str]]) -> bool:
+        """
+        True si ya existe algún libro con alguno de estos (title, author),
+        ya normalizados. Consulta cubierta: solo proyecta title_norm (sin _id,
+        que no está en el índice), así la resuelve books_title_author_uniq
+        sin leer el documento.
+        """
+        query = {"$or": [{"title_norm": title, "author_norm": author} for title, author in keys]}
+        doc = await self._collection.find_one(query, projection={"_id": 0, "title_norm": 1})
+        return doc is not None
+
+    def _find_books(
+        self,
+        *,
+        after_id: Optional[str],
+        skip: int,
+        limit: int,
+        filters: Optional[Dict[str, Any]],
+    ) -> AsyncIOMotorCursor:
+        """
+        Construye el cursor de listado (compartido por list_books e iter_books).
+        Lanza ValueError de inmediato si after_id no es un ObjectId válido.
+        """
+        query: Dict[str, Any] = dict(filters) if filters else {}
+        if after_id is not None:
+            query["_id"] = {"$gt": self._to_object_id(after_id)}
+
+        cursor = (
+            self._collection
+            .find(query, projection=self._BOOK_PROJECTION)
+            .sort("_id", 1)
+            # Toda la página en un solo batch: sin getMore extra
+            .batch_size(limit)
+            .skip(skip)
+            .limit(limit)
+        )
+
+        # Solo genre: (genre, _id) resuelve filtro y sort por _id sin sort en
+        # memoria, y evitamos que el planner elija books_filter_idx (que obliga
+        # a ordenar todo el genre). Con más filtros decide el planner.
+        if self._use_filter_hint and filters and filters.keys() == {"genre"}:
+            cursor = cursor.hint(self._GENRE_INDEX)
+
+        return cursor
+
     async def list_books(
         self,
         *,
+        after_id: Optional[str] = None,
         skip: int = 0,
         limit: int = 50,
         filters: Optional[Dict[str, Any]] = None,
     ) -> List[BookRead]:
         """
         Lista libros con paginación y filtros opcionales.
+        - after_id: paginación por cursor (keyset); devuelve los libros con _id mayor a este.
+          Es la forma recomendada: usa el índice de _id en vez de recorrer 'skip' documentos.
+        - skip: paginación clásica, se mantiene por compatibilidad.
         - filters puede ser algo como {"author": "Nombre", "genre": "Ficción"}
         """
-        query: Dict[str, Any] = filters or {}
+        cursor = self._find_books(after_id=after_id, skip=skip, limit=limit, filters=filters)
 
-        cursor = (
-            self._collection
-            .find(query)
-            .skip(skip)
-            .limit(limit)
-        )
+        # to_list vacía el cursor en un solo await (no un await por documento)
+        docs = await cursor.to_list(length=limit)
+        return [self._document_to_book_read(doc) for doc in docs]
 
-        books: List[BookRead] = []
-        async for doc in cursor:
-            books.append(self._document_to_book_read(doc))
+    async def list_books_with_count(
+        self,
+        *,
+        after_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[List[BookRead], int]:
+        """
+        Devuelve la página de libros y el total que cumple los filtros.
+        Las dos consultas son independientes, así que se lanzan en paralelo.
+        """
+        # El cursor se arma antes del gather: un after_id inválido lanza
+        # ValueError aquí, sin haber mandado el count al servidor.
+        cursor = self._find_books(after_id=after_id, skip=skip, limit=limit, filters=filters)
+        docs, total = await asyncio.gather(
+            cursor.to_list(length=limit),
+            self._collection.count_documents(dict(filters) if filters else {}),
+        )
+        return [self._document_to_book_read(doc) for doc in docs], total
 
-        return books
+    def iter_books(
+        self,
+        *,
+        after_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[BookRead]:
+        """
+        Igual que list_books, pero devuelve los libros de a uno a medida que
+        llegan del cursor, sin armar la lista completa en memoria.
+        """
+        cursor = self._find_books(after_id=after_id, skip=skip, limit=limit, filters=filters)
+        return (self._document_to_book_read(doc) async for doc in cursor)
 
     # ======================================================
     # =====================  UPDATE  =======================
@@ -117,22 +237,20 @@ class BookRepository:
         Devuelve el BookRead actualizado o None si no existe.
         """
         oid = self._to_object_id(book_id)
-        update_data = book_in.model_dump(exclude_unset=True)
+        update_data = self._with_norm_fields(book_in.model_dump(exclude_unset=True))
 
         if not update_data:
             # Nada que actualizar; la capa de servicio decide qué hacer con esto.
-            doc = await self._collection.find_one({"_id": oid})
+            doc = await self._collection.find_one({"_id": oid}, projection=self._BOOK_PROJECTION)
             return self._document_to_book_read(doc) if doc else None
 
-        result = await self._collection.update_one(
+        # find_one_and_update devuelve el documento ya actualizado en un solo viaje.
+        updated = await self._collection.find_one_and_update(
             {"_id": oid},
             {"$set": update_data},
+            projection=self._BOOK_PROJECTION,
+            return_document=ReturnDocument.AFTER,
         )
-
-        if result.matched_count == 0:
-            return None
-
-        updated = await self._collection.find_one({"_id": oid})
         if updated is None:
             return None
 
@@ -1,9 +1,11 @@
 # src/repositories/user_repository.py
 
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, Iterable, List, Optional, Dict, Any
 
 from bson import ObjectId
-from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorCollection
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorCollection, AsyncIOMotorCursor
 
 from src.schemas.users import UserRead, UserCreate, UserUpdate
 
@@ -14,6 +16,10 @@ class UserRepository:
     SOLO maneja operaciones contra MongoDB (sin lógica de negocio).
     """
 
+    # Solo los campos que usa UserRead, derivados del modelo para que no se
+    # desincronicen (id sale de _id, que siempre viene por defecto).
+    _USER_PROJECTION: Dict[str, int] = {f: 1 for f in UserRead.model_fields if f != "id"}
+
     def __init__(self, db: AsyncIOMotorDatabase) -> None:
         self._collection: AsyncIOMotorCollection = db["users"]
 
@@ -27,17 +33,23 @@ class UserRepository:
         Convierte un string a ObjectId.
         Lanza ValueError si el formato no es válido (la capa de servicio decide qué hacer).
         """
-        if not ObjectId.is_valid(user_id):
-            # (Tu mensaje decía "ID de libro", lo ajusto a "usuario")
+        # Un solo parseo del hex (ObjectId.is_valid + ObjectId() lo hacían dos veces)
+        try:
+            return ObjectId(user_id)
+        except (InvalidId, TypeError):
             raise ValueError(f"ID de usuario inválido: {user_id}")
-        return ObjectId(user_id)
 
     @staticmethod
     def _document_to_user_read(doc: Dict[str, Any]) -> UserRead:
         """
         Convierte un documento de MongoDB en un modelo UserRead.
+
+        Usa model_construct (sin validación): SOLO para datos que vienen de la
+        DB. Todo lo que se escribe pasa antes por los schemas: *Create exige
+        cada campo y UserUpdate rechaza null explícito, así que un campo guardado
+        nunca queda en null. Lo que llega del cliente se sigue validando.
         """
-        return UserRead(
+        return UserRead.model_construct(
             id=str(doc["_id"]),
             first_name=doc["first_name"],
             last_name=doc["last_name"],
@@ -56,11 +68,20 @@ class UserRepository:
         user_dict = user_in.model_dump()
         result = await self._collection.insert_one(user_dict)
 
-        created = await self._collection.find_one({"_id": result.inserted_id})
-        if created is None:
-            raise RuntimeError("Error al recuperar el usuario recién creado")
+        # Construimos el UserRead con lo insertado, sin un segundo find_one.
+        user_dict["_id"] = result.inserted_id
+        return self._document_to_user_read(user_dict)
+
+    async def create_users(self, users_in: List[UserCreate]) -> List[UserRead]:
+        """
+        Inserta varios usuarios en un solo viaje (insert_many) y devuelve sus UserRead.
+        """
+        user_dicts = [user_in.model_dump() for user_in in users_in]
+        result = await self._collection.insert_many(user_dicts, ordered=False)
 
-        return self._document_to_user_read(created)
+        for user_dict, inserted_id in zip(user_dicts, result.inserted_ids):
+            user_dict["_id"] = inserted_id
+        return [self._document_to_user_read(user_dict) for user_dict in user_dicts]
 
     # ======================================================
     # ======================  READ  ========================
@@ -71,7 +92,7 @@ class UserRepository:
         Devuelve un usuario por su ID o None si no existe.
         """
         oid = self._to_object_id(user_id)
-        doc = await self._collection.find_one({"_id": oid})
+        doc = await self._collection.find_one({"_id": oid}, projection=self._USER_PROJECTION)
         if doc is None:
             return None
         return self._document_to_user_read(doc)
@@ -80,33 +101,76 @@ class UserRepository:
         """
         Devuelve un usuario por email o None si no existe.
         """
-        doc = await self._collection.find_one({"email": email})
+        doc = await self._collection.find_one({"email": email}, projection=self._USER_PROJECTION)
         if doc is None:
             return None
         return self._document_to_user_read(doc)
 
+    async def exists_by_email(self, emails: Iterable[str]) -> bool:
+        """
+        True si ya existe algún usuario con alguno de estos emails (ya normalizados).
+        Consulta cubierta: solo proyecta email (sin _id, que no está en el índice),
+        así la resuelve el índice único de email sin leer el documento.
+        """
+        doc = await self._collection.find_one(
+            {"email": {"$in": list(emails)}}, projection={"_id": 0, "email": 1}
+        )
+        return doc is not None
+
+    def _find_users(
+        self,
+        *,
+        after_id: Optional[str],
+        skip: int,
+        limit: int,
+        filters: Optional[Dict[str, Any]],
+    ) -> AsyncIOMotorCursor:
+        """
+        Construye el cursor de listado (compartido por list_users e iter_users).
+        Lanza ValueError de inmediato si after_id no es un ObjectId válido.
+        """
+        query: Dict[str, Any] = dict(filters) if filters else {}
+        if after_id is not None:
+            # Paginación por cursor (keyset) sobre _id
+            query["_id"] = {"$gt": self._to_object_id(after_id)}
+
+        return (
+            self._collection
+            .find(query, projection=self._USER_PROJECTION)
+            .sort("_id", 1)
+            .batch_size(limit)
+            .skip(skip)
+            .limit(limit)
+        )
+
     async def list_users(
         self,
         *,
+        after_id: Optional[str] = None,
         skip: int = 0,
         limit: int = 50,
         filters: Optional[Dict[str, Any]] = None,
     ) -> List[UserRead]:
-     
-        query: Dict[str, Any] = filters or {}
 
-        cursor = (
-            self._collection
-            .find(query)
-            .skip(skip)
-            .limit(limit)
-        )
+        cursor = self._find_users(after_id=after_id, skip=skip, limit=limit, filters=filters)
 
-        users: List[UserRead] = []
-        async for doc in cursor:
-            users.append(self._document_to_user_read(doc))
+        # to_list vacía el cursor en un solo await (no un await por documento)
+        docs = await cursor.to_list(length=limit)
+        return [self._document_to_user_read(doc) for doc in docs]
 
-        return users
+    def iter_users(
+        self,
+        *,
+        after_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[UserRead]:
+        """
+        Igual que list_users, pero emite los usuarios a medida que llegan del cursor.
+        """
+        cursor = self._find_users(after_id=after_id, skip=skip, limit=limit, filters=filters)
+        return (self._document_to_user_read(doc) async for doc in cursor)
 
     # ======================================================
     # =====================  UPDATE  =======================
@@ -123,18 +187,16 @@ class UserRepository:
 
         if not update_data:
             # Nada que actualizar; devolvemos el doc actual si existe
-            doc = await self._collection.find_one({"_id": oid})
+            doc = await self._collection.find_one({"_id": oid}, projection=self._USER_PROJECTION)
             return self._document_to_user_read(doc) if doc else None
 
-        result = await self._collection.update_one(
+        # find_one_and_update devuelve el documento ya actualizado en un solo viaje.
+        updated = await self._collection.find_one_and_update(
             {"_id": oid},
             {"$set": update_data},
+            projection=self._USER_PROJECTION,
+            return_document=ReturnDocument.AFTER,
         )
-
-        if result.matched_count == 0:
-            return None
-
-        updated = await self._collection.find_one({"_id": oid})
         if updated is None:
             return None
 
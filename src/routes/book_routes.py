@@ -1,21 +1,41 @@
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, Query, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi import APIRouter, Body, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
-from src.db.db import get_db
-from src.repositories.book_repository import BookRepository
-from src.schemas.book import BookCreate, BookRead, BookUpdate
+from src.schemas.book import BOOK_LIST_ADAPTER, BookCreate, BookPage, BookRead, BookUpdate
 from src.services.book_service import BookService
+from src.routes.streaming import NDJSON_MEDIA_TYPE, iter_ndjson
 
 router = APIRouter(prefix="/books", tags=["Books"])
 
+# Tope de documentos por alta masiva (acota memoria y tamaño del insert_many)
+BULK_MAX_ITEMS = 500
+
 
 # -------------------- Dependencies --------------------
 
-def get_book_service(db: AsyncIOMotorDatabase = Depends(get_db)) -> BookService:
-    repo = BookRepository(db)
-    return BookService(repo)
+async def get_book_service(request: Request) -> BookService:
+    # El servicio se construye una vez en el lifespan (ver main.py).
+    # 'async def' a propósito: una dependencia 'def' se ejecuta en el threadpool.
+    return request.app.state.book_service
+
+
+def _build_filters(
+    *,
+    title: Optional[str],
+    author: Optional[str],
+    genre: Optional[str],
+) -> Dict[str, Any]:
+    # Solo los filtros que vienen informados (igualdad exacta)
+    filters: Dict[str, Any] = {}
+    if title:
+        filters["title"] = title
+    if author:
+        filters["author"] = author
+    if genre:
+        filters["genre"] = genre
+    return filters
 
 
 # -------------------- Routes --------------------
@@ -32,24 +52,91 @@ async def create_book(
     return await service.create_book(payload)
 
 
+@router.post(
+    "/bulk",
+    response_model=List[BookRead],
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_books(
+    payload: List[BookCreate] = Body(..., min_length=1, max_length=BULK_MAX_ITEMS),
+    service: BookService = Depends(get_book_service),
+) -> Response:
+    created = await service.create_books(payload)
+    # Igual que en GET /books: una sola serialización, sin re-validar
+    return Response(
+        content=BOOK_LIST_ADAPTER.dump_json(created),
+        media_type="application/json",
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
 @router.get("",response_model=List[BookRead],)
 async def list_books(
-    skip: int = Query(0, ge=0),
+    after_id: Optional[str] = Query(None, description="Cursor: ID del último libro de la página anterior"),
+    skip: int = Query(0, ge=0, deprecated=True),
     limit: int = Query(50, ge=1, le=200),
     title: Optional[str] = Query(None),
     author: Optional[str] = Query(None),
     genre: Optional[str] = Query(None),
     service: BookService = Depends(get_book_service),
-) -> List[BookRead]:
-    filters: Dict[str, Any] = {}
-    if title:
-        filters["title"] = title
-    if author:
-        filters["author"] = author
-    if genre:
-        filters["genre"] = genre
-
-    return await service.list_books(skip=skip, limit=limit, filters=filters or None)
+) -> Response:
+    filters = _build_filters(title=title, author=author, genre=genre)
+
+    books = await service.list_books(
+        after_id=after_id, skip=skip, limit=limit, filters=filters or None
+    )
+    # Página llena: el último ID sirve como cursor para pedir la siguiente
+    headers = {"X-Next-Cursor": books[-1].id} if len(books) == limit else None
+
+    # Los BookRead ya vienen armados por el repo: se serializan de una vez y,
+    # al devolver un Response, FastAPI no los re-valida contra response_model
+    # (que queda solo para la documentación OpenAPI).
+    return Response(
+        content=BOOK_LIST_ADAPTER.dump_json(books),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+# Debe ir antes de "/{book_id}" para que "page" no se tome como un ID
+@router.get("/page", response_model=BookPage)
+async def list_books_page(
+    after_id: Optional[str] = Query(None, description="Cursor: ID del último libro de la página anterior"),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(50, ge=1, le=200),
+    title: Optional[str] = Query(None),
+    author: Optional[str] = Query(None),
+    genre: Optional[str] = Query(None),
+    service: BookService = Depends(get_book_service),
+) -> Response:
+    """Igual que GET /books pero con el total de resultados: {items, total}."""
+    filters = _build_filters(title=title, author=author, genre=genre)
+
+    page = await service.list_books_page(
+        after_id=after_id, skip=skip, limit=limit, filters=filters or None
+    )
+    # BookPage ya viene armado: se serializa directo (sin re-validar los items)
+    return Response(content=page.model_dump_json(), media_type="application/json")
+
+
+# Debe ir antes de "/{book_id}" para que "stream" no se tome como un ID
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_books(
+    after_id: Optional[str] = Query(None, description="Cursor: ID del último libro de la página anterior"),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(50, ge=1, le=200),
+    title: Optional[str] = Query(None),
+    author: Optional[str] = Query(None),
+    genre: Optional[str] = Query(None),
+    service: BookService = Depends(get_book_service),
+) -> StreamingResponse:
+    """Igual que GET /books pero en NDJSON (un BookRead por línea)."""
+    filters = _build_filters(title=title, author=author, genre=genre)
+
+    books = service.iter_books(
+        after_id=after_id, skip=skip, limit=limit, filters=filters or None
+    )
+    return StreamingResponse(iter_ndjson(books), media_type=NDJSON_MEDIA_TYPE)
 
 
 @router.get(
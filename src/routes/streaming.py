@@ -0,0 +1,16 @@
+# src/routes/streaming.py
+
+from typing import AsyncIterator
+
+from pydantic import BaseModel
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def iter_ndjson(items: AsyncIterator[BaseModel]) -> AsyncIterator[str]:
+    """
+    Serializa cada modelo como una línea JSON (NDJSON) a medida que llega,
+    para usarlo con StreamingResponse sin armar la lista completa en memoria.
+    """
+    async for item in items:
+        yield item.model_dump_json() + "\n"
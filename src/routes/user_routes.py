@@ -1,23 +1,26 @@
-# src/routers/user_router.py
+# src/routes/user_routes.py
 
 from typing import List, Optional, Dict, Any
 
-from fastapi import APIRouter, Depends, Query, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi import APIRouter, Body, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
-from src.db.db import get_db
-from src.repositories.user_repostory import UserRepository
-from src.schemas.users import UserCreate, UserRead, UserUpdate
+from src.schemas.users import USER_LIST_ADAPTER, UserCreate, UserRead, UserUpdate
 from src.services.user_service import UserService
+from src.routes.streaming import NDJSON_MEDIA_TYPE, iter_ndjson
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
+# Tope de documentos por alta masiva (acota memoria y tamaño del insert_many)
+BULK_MAX_ITEMS = 500
+
 
 # -------------------- Dependencies --------------------
 
-def get_user_service(db: AsyncIOMotorDatabase = Depends(get_db)) -> UserService:
-    repo = UserRepository(db)
-    return UserService(repo)
+async def get_user_service(request: Request) -> UserService:
+    # El servicio se construye una vez en el lifespan (ver main.py).
+    # 'async def' a propósito: una dependencia 'def' se ejecuta en el threadpool.
+    return request.app.state.user_service
 
 
 # ======================================================
@@ -27,12 +30,37 @@ def get_user_service(db: AsyncIOMotorDatabase = Depends(get_db)) -> UserService:
 @router.get("", response_model=List[UserRead], status_code=status.HTTP_200_OK)
 async def list_all_users(
     service: UserService = Depends(get_user_service),
-    skip: int = Query(0, ge=0),
+    after_id: Optional[str] = Query(None, description="Cursor: ID del último usuario de la página anterior"),
+    skip: int = Query(0, ge=0, deprecated=True),
     limit: int = Query(50, ge=1, le=200),
     email: Optional[str] = Query(None, description="Filtro opcional por email exacto"),
-) -> List[UserRead]:
+) -> Response:
     filters: Optional[Dict[str, Any]] = {"email": email} if email else None
-    return await service.list_users(skip=skip, limit=limit, filters=filters)
+    users = await service.list_users(after_id=after_id, skip=skip, limit=limit, filters=filters)
+    # Página llena: el último ID sirve como cursor para pedir la siguiente
+    headers = {"X-Next-Cursor": users[-1].id} if len(users) == limit else None
+
+    # Serialización de la lista en una sola llamada, sin re-validar cada UserRead
+    return Response(
+        content=USER_LIST_ADAPTER.dump_json(users),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+# Debe ir antes de "/{user_id}" para que "stream" no se tome como un ID
+@router.get("/stream", response_class=StreamingResponse, status_code=status.HTTP_200_OK)
+async def stream_all_users(
+    service: UserService = Depends(get_user_service),
+    after_id: Optional[str] = Query(None, description="Cursor: ID del último usuario de la página anterior"),
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(50, ge=1, le=200),
+    email: Optional[str] = Query(None, description="Filtro opcional por email exacto"),
+) -> StreamingResponse:
+    """Igual que GET /users pero en NDJSON (un UserRead por línea)."""
+    filters: Optional[Dict[str, Any]] = {"email": email} if email else None
+    users = service.iter_users(after_id=after_id, skip=skip, limit=limit, filters=filters)
+    return StreamingResponse(iter_ndjson(users), media_type=NDJSON_MEDIA_TYPE)
 
 
 @router.get("/{user_id}", response_model=UserRead, status_code=status.HTTP_200_OK)
@@ -64,6 +92,20 @@ async def create_user(
     return await service.create_user(payload)
 
 
+@router.post("/bulk", response_model=List[UserRead], status_code=status.HTTP_201_CREATED)
+async def create_users(
+    payload: List[UserCreate] = Body(..., min_length=1, max_length=BULK_MAX_ITEMS),
+    service: UserService = Depends(get_user_service),
+) -> Response:
+    created = await service.create_users(payload)
+    # Igual que en GET /users: una sola serialización, sin re-validar
+    return Response(
+        content=USER_LIST_ADAPTER.dump_json(created),
+        media_type="application/json",
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
 # ======================================================
 # ======================  UPDATE  ======================
 # ======================================================
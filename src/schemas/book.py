@@ -1,6 +1,5 @@
-from typing import Optional
-from datetime import date
-from pydantic import BaseModel, Field, ConfigDict, computed_field, field_validator
+from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, field_validator
 
 
 # ======================================================
@@ -40,6 +39,16 @@ class BookUpdate(BaseModel):
     genre: Optional[str] = None
     total_copies: Optional[int] = Field(None, ge=0)
 
+    @field_validator("title", "author", "genre", "total_copies")
+    @classmethod
+    def reject_explicit_null(cls, v):
+        # Omitir el campo = no modificarlo. Un null explícito dejaría el libro
+        # sin título/autor y con title_norm/author_norm viejos en el índice único.
+        # (El validador no corre para los campos omitidos: quedan en None por defecto.)
+        if v is None:
+            raise ValueError("El campo no puede ser null (omítelo para no modificarlo)")
+        return v
+
     @field_validator("total_copies")
     @classmethod
     def validate_total_copies(cls, v):
@@ -57,6 +66,24 @@ class BookRead(BookBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+# Adapter para listas: se construye una vez (al importar) y serializa la
+# lista completa en una sola llamada a pydantic-core.
+BOOK_LIST_ADAPTER: TypeAdapter[List[BookRead]] = TypeAdapter(List[BookRead])
+
+
+# ======================================================
+# ===============  READ MODEL PAGINADO  ================
+# ======================================================
+
+class BookPage(BaseModel):
+    items: List[BookRead] = Field(..., description="Libros de la página actual")
+    total: int = Field(..., ge=0, description="Total de libros que cumplen los filtros")
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Valor para after_id de la página siguiente (None si no hay más)",
+    )
+
+
 # ======================================================
 # ============  READ MODEL PARA PRESTAMOS  =============
 # ======================================================
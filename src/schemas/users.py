@@ -1,6 +1,6 @@
 from typing import List, Optional
 from datetime import datetime, date
-from pydantic import BaseModel, Field, EmailStr, ConfigDict, computed_field, field_validator
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, TypeAdapter, computed_field, field_validator
 """ from loans import LoanWithBook """
 
 
@@ -55,6 +55,15 @@ class UserUpdate(BaseModel):
     role: Optional[str] = None
     password: Optional[str] = Field(None, min_length=6)
 
+    @field_validator("first_name", "last_name", "email", "role", "password")
+    @classmethod
+    def reject_explicit_null(cls, v):
+        # Omitir el campo = no modificarlo; un null explícito dejaría el usuario
+        # sin ese dato (y el repositorio lee sin re-validar, ver model_construct).
+        if v is None:
+            raise ValueError("El campo no puede ser null (omítelo para no modificarlo)")
+        return v
+
     @field_validator("role")
     @classmethod
     def validate_role(cls, v):
@@ -74,6 +83,10 @@ class UserRead(UserBase):
     id: str = Field(..., description="ID único en MongoDB")
     model_config = ConfigDict(from_attributes=True)
 
+# Adapter para listas: se construye una vez (al importar) y serializa la
+# lista completa en una sola llamada a pydantic-core.
+USER_LIST_ADAPTER: TypeAdapter[List[UserRead]] = TypeAdapter(List[UserRead])
+
 # ======================================================
 # ===========  READ MODEL FOR USER'S LOANS  ============
 # ======================================================
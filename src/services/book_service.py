@@ -2,12 +2,21 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional, Tuple
 
+from cachetools import TTLCache
 from fastapi import HTTPException, status
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from src.repositories.book_repository import BookRepository
-from src.schemas.book import BookCreate, BookUpdate, BookRead
+from src.schemas.book import BookCreate, BookUpdate, BookRead, BookPage
+from src.utils.normalize import normalize_str
+
+# Cache de list_books: absorbe consultas repetidas (ej: polling de la UI).
+# Cada escritura lo vacía; con varios workers cada uno tiene el suyo, así que
+# otro worker puede servir datos de hasta _LIST_CACHE_TTL segundos.
+_LIST_CACHE_MAXSIZE = 1024
+_LIST_CACHE_TTL = 30
 
 
 class BookService:
@@ -20,39 +29,36 @@ class BookService:
 
     def __init__(self, repo: BookRepository) -> None:
         self._repo = repo
+        self._list_cache: TTLCache[Tuple[Hashable, ...], List[BookRead]] = TTLCache(
+            maxsize=_LIST_CACHE_MAXSIZE, ttl=_LIST_CACHE_TTL
+        )
+        # Se incrementa en cada invalidación: una consulta que empezó antes de
+        # una escritura no debe guardar su resultado (ya viejo) en el cache.
+        self._cache_generation = 0
 
     # ======================================================
     # =====================  HELPERS  ======================
     # ======================================================
 
-    @staticmethod
-    def _normalize_str(value: str) -> str:
-        # Normalización básica para comparaciones.
-        # (Puedes mejorar con unidecode si quieres ignorar tildes)
-        return value.strip().lower()
-
-    async def _ensure_not_duplicate_on_create(self, book_in: BookCreate) -> None:
-        """
-        Regla de negocio:
-        Evitar duplicados. Aquí asumimos duplicado si coincide:
-        - title
-        - author
-        - published_year  (si existe en tu schema)
-        Ajusta según tu modelo real.
-        """
-        # Nota: tu BookRepository actual no incluye published_year en BookRead,
-        # pero tu schema inicial sí lo tenía. Si tu BookCreate tiene published_year,
-        # úsalo. Si no, elimina esa parte.
-        filters: Dict[str, Any] = {
-            "title": book_in.title,
-            "author": book_in.author,
-        }
+    def _invalidate_cache(self) -> None:
+        # Cualquier escritura puede cambiar cualquier página: se vacía entero
+        self._list_cache.clear()
+        self._cache_generation += 1
 
-        existing = await self._repo.list_books(skip=0, limit=1, filters=filters)
-        if existing:
+    @staticmethod
+    def _ensure_valid_limit(limit: int) -> None:
+        # Regla simple: límites razonables (evitar que pidan 100000)
+        if limit > 200:
             raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Ya existe un libro con los mismos datos (posible duplicado).",
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="El parámetro 'limit' no puede ser mayor a 200.",
+            )
+        # limit(0) / batch_size(0) en Mongo significan "sin límite" y "batch por
+        # defecto": la página dejaría de salir en un solo batch acotado
+        if limit < 1:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="El parámetro 'limit' debe ser al menos 1.",
             )
 
     async def _ensure_book_exists(self, book_id: str) -> BookRead:
@@ -80,21 +86,56 @@ class BookService:
     # ======================================================
 
     async def create_book(self, book_in: BookCreate) -> BookRead:
-        # (Opcional) normalizar strings de entrada
-        # book_in.title = book_in.title.strip()  # si tu modelo permite mutación
-        # Mejor: crea dict normalizado si quieres
+        # Regla de negocio: no duplicar libros (mismo title + author, sin
+        # distinguir mayúsculas). La hace cumplir el índice único sobre los
+        # campos normalizados: sin consulta previa y sin carrera entre chequeo e insert.
+        try:
+            created = await self._repo.create_book(book_in)
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ya existe un libro con los mismos datos (posible duplicado).",
+            )
 
-        await self._ensure_not_duplicate_on_create(book_in)
+        self._invalidate_cache()
+        return created
+
+    async def create_books(self, books_in: List[BookCreate]) -> List[BookRead]:
+        """
+        Alta masiva. Misma regla de duplicados que create_book (title + author),
+        pero resuelta con una sola consulta para todo el lote.
+        """
+        keys = {
+            (normalize_str(book_in.title), normalize_str(book_in.author))
+            for book_in in books_in
+        }
+        if len(keys) != len(books_in):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El lote contiene libros repetidos (mismo título y autor).",
+            )
+
+        # Se valida antes del insert_many: con ordered=False el índice único
+        # rechazaría solo los duplicados y el resto del lote quedaría insertado.
+        if await self._repo.exists_by_title_author(keys):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ya existe un libro con los mismos datos (posible duplicado).",
+            )
 
         try:
-            return await self._repo.create_book(book_in)
-        except RuntimeError as e:
-            # Error inesperado al recuperar lo insertado, etc.
+            created = await self._repo.create_books(books_in)
+        except BulkWriteError:
+            # ordered=False: parte del lote pudo haberse insertado igual
+            self._invalidate_cache()
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=str(e),
+                status_code=status.HTTP_409_CONFLICT,
+                detail="No se pudo insertar el lote completo (posible duplicado).",
             )
 
+        self._invalidate_cache()
+        return created
+
     # ======================================================
     # =======================  READ  =======================
     # ======================================================
@@ -105,41 +146,99 @@ class BookService:
     async def list_books(
         self,
         *,
+        after_id: Optional[str] = None,
         skip: int = 0,
         limit: int = 50,
         filters: Optional[Dict[str, Any]] = None,
     ) -> List[BookRead]:
-        # Regla simple: límites razonables (evitar que pidan 100000)
-        if limit > 200:
+        self._ensure_valid_limit(limit)
+
+        key = (after_id, skip, limit, frozenset((filters or {}).items()))
+        cached = self._list_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
+        # (Opcional) normalizar filtros de texto para búsquedas case-insensitive
+        # Esto depende de cómo guardas datos e índices.
+        try:
+            books = await self._repo.list_books(
+                after_id=after_id, skip=skip, limit=limit, filters=filters
+            )
+        except ValueError as e:
+            # after_id con formato de ObjectId inválido
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="El parámetro 'limit' no puede ser mayor a 200.",
+                detail=str(e),
             )
 
-        # (Opcional) normalizar filtros de texto para búsquedas case-insensitive
-        # Esto depende de cómo guardas datos e índices.
-        return await self._repo.list_books(skip=skip, limit=limit, filters=filters)
+        # Sin lock: get/set del cache son síncronos (atómicos en el event loop);
+        # bloquear alrededor del await serializaría todos los listados.
+        if generation == self._cache_generation:
+            self._list_cache[key] = books
+        return books
+
+    async def list_books_page(
+        self,
+        *,
+        after_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> BookPage:
+        self._ensure_valid_limit(limit)
+
+        try:
+            books, total = await self._repo.list_books_with_count(
+                after_id=after_id, skip=skip, limit=limit, filters=filters
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e),
+            )
+        # Página llena: el último ID sirve como cursor para pedir la siguiente
+        next_cursor = books[-1].id if len(books) == limit else None
+        return BookPage(items=books, total=total, next_cursor=next_cursor)
+
+    def iter_books(
+        self,
+        *,
+        after_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[BookRead]:
+        """
+        Versión en streaming de list_books.
+        Las validaciones (limit, after_id) se hacen antes de empezar a emitir,
+        así los errores siguen saliendo como HTTPException normales.
+        """
+        self._ensure_valid_limit(limit)
+        try:
+            return self._repo.iter_books(
+                after_id=after_id, skip=skip, limit=limit, filters=filters
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e),
+            )
 
     # ======================================================
     # ======================  UPDATE  ======================
     # ======================================================
 
     async def update_book(self, book_id: str, book_in: BookUpdate) -> BookRead:
-        # 1) Asegurar que existe (y validar ObjectId)
-        _ = await self._ensure_book_exists(book_id)
-
-        # 2) Si no trae cambios, para mí es regla de negocio:
-        #    devolver el libro actual (o lanzar 422 si prefieres)
+        # 1) Si no trae cambios, para mí es regla de negocio:
+        #    devolver el libro actual (o lanzar 422 si prefieres).
+        #    Se resuelve con una sola lectura (que ya valida existencia e ID).
         update_data = book_in.model_dump(exclude_unset=True)
         if not update_data:
-            # Devuelve el actual
             return await self._ensure_book_exists(book_id)
 
-        # 3) (Opcional) regla de duplicado en update:
-        #    si cambian title/author/published_year, verificar que no choque
-        #    con otro documento. Requiere método repo adicional para buscar
-        #    excluyendo el _id actual, por eso aquí lo dejo como comentario.
-
+        # 2) Regla de duplicado en update: si cambian title/author y chocan con
+        #    otro libro, el índice único lo rechaza (DuplicateKeyError).
         try:
             updated = await self._repo.update_book(book_id, book_in)
         except ValueError as e:
@@ -147,14 +246,20 @@ class BookService:
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=str(e),
             )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ya existe otro libro con el mismo título y autor.",
+            )
 
+        # Sin lectura previa: el resultado del update dice si existía
         if updated is None:
-            # raro porque ya validamos existencia, pero por consistencia:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Libro no encontrado.",
             )
 
+        self._invalidate_cache()
         return updated
 
     # ======================================================
@@ -162,9 +267,7 @@ class BookService:
     # ======================================================
 
     async def delete_book(self, book_id: str) -> None:
-        # validar existence + id format
-        await self._ensure_book_exists(book_id)
-
+        # Sin lectura previa: deleted_count ya dice si existía
         try:
             deleted = await self._repo.delete_book(book_id)
         except ValueError as e:
@@ -178,3 +281,5 @@ class BookService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Libro no encontrado.",
             )
+
+        self._invalidate_cache()
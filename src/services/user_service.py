@@ -2,12 +2,20 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, Hashable, List, Optional, Tuple
 
+from cachetools import TTLCache
 from fastapi import HTTPException, status
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from src.repositories.user_repostory import UserRepository
 from src.schemas.users import UserRead, UserCreate, UserUpdate
+from src.utils.normalize import normalize_str
+
+# Cache de list_users / get_user_by_email (mismo criterio que en BookService):
+# cada escritura lo vacía; con varios workers cada uno tiene el suyo.
+_CACHE_MAXSIZE = 1024
+_CACHE_TTL = 30
 
 
 class UserService:
@@ -20,28 +28,46 @@ class UserService:
 
     def __init__(self, repo: UserRepository) -> None:
         self._repo = repo
+        self._list_cache: TTLCache[Tuple[Hashable, ...], List[UserRead]] = TTLCache(
+            maxsize=_CACHE_MAXSIZE, ttl=_CACHE_TTL
+        )
+        self._email_cache: TTLCache[str, UserRead] = TTLCache(
+            maxsize=_CACHE_MAXSIZE, ttl=_CACHE_TTL
+        )
+        # Se incrementa en cada invalidación (ver BookService)
+        self._cache_generation = 0
 
     # ======================================================
     # =====================  HELPERS  ======================
     # ======================================================
 
     @staticmethod
-    def _normalize_str(value: str) -> str:
-        return value.strip().lower()
+    def _normalize_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # El email se guarda normalizado: el filtro por email también
+        if filters and isinstance(filters.get("email"), str):
+            filters = dict(filters)
+            filters["email"] = normalize_str(filters["email"])
+        return filters
 
-    async def _ensure_not_duplicated_on_create(self, user_in: UserCreate) -> None:
-        """
-        Regla de negocio:
-        - Evitar duplicar usuarios por email.
-        """
-        email = self._normalize_str(user_in.email)
+    def _invalidate_cache(self) -> None:
+        self._list_cache.clear()
+        self._email_cache.clear()
+        self._cache_generation += 1
 
-        # tu repo tiene método directo por email: úsalo (más eficiente que list_users)
-        existing = await self._repo.get_user_by_email(email)
-        if existing:
+    @staticmethod
+    def _ensure_valid_limit(limit: int) -> None:
+        # Regla simple: límites razonables (evitar que pidan 100000)
+        if limit > 200:
             raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Ya existe un usuario con ese email.",
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="El parámetro 'limit' no puede ser mayor a 200.",
+            )
+        # limit(0) / batch_size(0) en Mongo significan "sin límite" y "batch por
+        # defecto": la página dejaría de salir en un solo batch acotado
+        if limit < 1:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="El parámetro 'limit' debe ser al menos 1.",
             )
 
     async def _ensure_user_exists(self, user_id: str) -> UserRead:
@@ -64,56 +90,64 @@ class UserService:
             )
         return user
 
-    async def _ensure_not_duplicated_on_update(
-        self,
-        user_id: str,
-        user_in: UserUpdate,
-    ) -> None:
-        """
-        Regla de negocio:
-        - Si se actualiza el email, no debe chocar con otro usuario.
-        """
-        update_data = user_in.model_dump(exclude_unset=True)
-
-        if "email" not in update_data:
-            return
+    # ======================================================
+    # ======================  CREATE  ======================
+    # ======================================================
 
-        new_email = self._normalize_str(update_data["email"])
-        existing = await self._repo.get_user_by_email(new_email)
+    async def create_user(self, user_in: UserCreate) -> UserRead:
+        # Normaliza el email una sola vez; model_copy no depende de que el
+        # modelo sea mutable (antes un setattr fallido dejaba el email sin normalizar)
+        user_in = user_in.model_copy(update={"email": normalize_str(user_in.email)})
 
-        # Si existe y NO es el mismo usuario, conflicto
-        if existing and existing.id != user_id:
+        # Regla de negocio: no duplicar usuarios por email. La hace cumplir el
+        # índice único de email (guardado normalizado): sin consulta previa.
+        try:
+            created = await self._repo.create_user(user_in)
+        except DuplicateKeyError:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
-                detail="El email ya está en uso por otro usuario.",
+                detail="Ya existe un usuario con ese email.",
             )
 
-    # ======================================================
-    # ======================  CREATE  ======================
-    # ======================================================
+        self._invalidate_cache()
+        return created
 
-    async def create_user(self, user_in: UserCreate) -> UserRead:
-        # Normaliza email (si tu schema permite mutación podrías setearlo;
-        # si no, crea un dict y reconstruye el modelo).
-        # Aquí asumimos que UserCreate es mutable o que no te molesta dejarlo tal cual.
-        normalized_email = self._normalize_str(user_in.email)
-        if normalized_email != user_in.email:
-            # intentamos mutar si se puede (pydantic v2 depende de config)
-            try:
-                user_in.email = normalized_email  # type: ignore[attr-defined]
-            except Exception:
-                pass
-
-        await self._ensure_not_duplicated_on_create(user_in)
+    async def create_users(self, users_in: List[UserCreate]) -> List[UserRead]:
+        """
+        Alta masiva. Normaliza los emails y valida duplicados (dentro del lote
+        y contra la base) con una sola consulta.
+        """
+        users_in = [
+            user_in.model_copy(update={"email": normalize_str(user_in.email)})
+            for user_in in users_in
+        ]
+        emails = [user_in.email for user_in in users_in]
+        if len(set(emails)) != len(emails):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El lote contiene emails repetidos.",
+            )
+
+        if await self._repo.exists_by_email(emails):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Ya existe un usuario con ese email.",
+            )
 
         try:
-            return await self._repo.create_user(user_in)
-        except RuntimeError as e:
+            created = await self._repo.create_users(users_in)
+        except BulkWriteError:
+            # p.ej. el índice único de email detectó una carrera con otra alta.
+            # ordered=False: parte del lote pudo haberse insertado igual.
+            self._invalidate_cache()
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=str(e),
+                status_code=status.HTTP_409_CONFLICT,
+                detail="No se pudo insertar el lote completo (email duplicado).",
             )
 
+        self._invalidate_cache()
+        return created
+
     # ======================================================
     # =======================  READ  =======================
     # ======================================================
@@ -122,60 +156,100 @@ class UserService:
         return await self._ensure_user_exists(user_id)
 
     async def get_user_by_email(self, email: str) -> UserRead:
-        normalized = self._normalize_str(email)
+        normalized = normalize_str(email)
+        cached = self._email_cache.get(normalized)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
         user = await self._repo.get_user_by_email(normalized)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuario no encontrado.",
             )
+
+        if generation == self._cache_generation:
+            self._email_cache[normalized] = user
         return user
 
     async def list_users(
         self,
         *,
+        after_id: Optional[str] = None,
         skip: int = 0,
         limit: int = 50,
         filters: Optional[Dict[str, Any]] = None,
     ) -> List[UserRead]:
-        if limit > 200:
+        self._ensure_valid_limit(limit)
+
+        filters = self._normalize_filters(filters)
+
+        key = (after_id, skip, limit, frozenset((filters or {}).items()))
+        cached = self._list_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = self._cache_generation
+
+        try:
+            users = await self._repo.list_users(
+                after_id=after_id, skip=skip, limit=limit, filters=filters
+            )
+        except ValueError as e:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="El parámetro 'limit' no puede ser mayor a 200.",
+                detail=str(e),
             )
 
-        # Opcional: normalizar filtro email si viene
-        if filters and "email" in filters and isinstance(filters["email"], str):
-            filters = dict(filters)
-            filters["email"] = self._normalize_str(filters["email"])
+        if generation == self._cache_generation:
+            self._list_cache[key] = users
+        return users
 
-        return await self._repo.list_users(skip=skip, limit=limit, filters=filters)
+    def iter_users(
+        self,
+        *,
+        after_id: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 50,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[UserRead]:
+        """
+        Versión en streaming de list_users.
+        Las validaciones (limit, after_id) se hacen antes de empezar a emitir,
+        así los errores siguen saliendo como HTTPException normales.
+        """
+        self._ensure_valid_limit(limit)
+        filters = self._normalize_filters(filters)
+
+        try:
+            return self._repo.iter_users(
+                after_id=after_id, skip=skip, limit=limit, filters=filters
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e),
+            )
 
     # ======================================================
     # ======================  UPDATE  ======================
     # ======================================================
 
     async def update_user(self, user_id: str, user_in: UserUpdate) -> UserRead:
-        # 1) validar existencia + formato id
-        _ = await self._ensure_user_exists(user_id)
-
-        # 2) si no trae cambios, devolvemos el doc actual
+        # 1) si no trae cambios, devolvemos el doc actual (una sola lectura)
         update_data = user_in.model_dump(exclude_unset=True)
         if not update_data:
             return await self._ensure_user_exists(user_id)
 
-        # 3) normalizar email si viene
-        if "email" in update_data and isinstance(update_data["email"], str):
-            normalized_email = self._normalize_str(update_data["email"])
-            if normalized_email != update_data["email"]:
-                try:
-                    user_in.email = normalized_email  # type: ignore[attr-defined]
-                except Exception:
-                    pass
-
-        # 4) regla: email no duplicado si se cambia
-        await self._ensure_not_duplicated_on_update(user_id, user_in)
+        # 2) normalizar email si viene (una sola vez; model_copy mantiene el
+        #    email como campo "seteado" para el exclude_unset del repo)
+        if isinstance(update_data.get("email"), str):
+            user_in = user_in.model_copy(
+                update={"email": normalize_str(update_data["email"])}
+            )
 
+        # 3) regla: email no duplicado si se cambia (la aplica el índice único;
+        #    volver a guardar el mismo email del propio usuario no choca)
         try:
             updated = await self._repo.update_user(user_id, user_in)
         except ValueError as e:
@@ -183,14 +257,20 @@ class UserService:
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
                 detail=str(e),
             )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El email ya está en uso por otro usuario.",
+            )
 
+        # Sin lectura previa: el resultado del update dice si existía
         if updated is None:
-            # raro, ya validamos existencia, pero por consistencia:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuario no encontrado.",
             )
 
+        self._invalidate_cache()
         return updated
 
     # ======================================================
@@ -198,8 +278,7 @@ class UserService:
     # ======================================================
 
     async def delete_user(self, user_id: str) -> None:
-        await self._ensure_user_exists(user_id)
-
+        # Sin lectura previa: deleted_count ya dice si existía
         try:
             deleted = await self._repo.delete_user(user_id)
         except ValueError as e:
@@ -213,3 +292,5 @@ class UserService:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuario no encontrado.",
             )
+
+        self._invalidate_cache()
@@ -0,0 +1,15 @@
+# src/utils/normalize.py
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def normalize_str(value: str) -> str:
+    """
+    Normalización de textos para comparar e indexar (email, title, author):
+    sin espacios en los extremos y en minúsculas.
+    Es la ÚNICA definición: servicios y repositorios la comparten para que las
+    claves de los índices únicos y los chequeos previos no se desincronicen.
+    Pura y con entradas muy repetidas: el cache la vuelve un lookup.
+    """
+    return value.strip().lower()
@@ -14,7 +14,11 @@ overrides de dependencias (ej: DB o repositorios) para que NO toque Mongo real
 import os
 import pytest
 from httpx import AsyncClient, ASGITransport
-from motor.motor_asyncio import AsyncIOMotorClient
+
+try:
+    import uvloop  # opcional: acelera el event loop de los tests
+except ImportError:  # Windows o entorno sin uvloop
+    uvloop = None
 
 import sys
 from pathlib import Path
@@ -27,13 +31,21 @@ ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
 
 from main import app
-from src.db import db as db_module  # para overridear get_db
+from src.db.db import ensure_indexes, get_client
+from src.repositories.book_repository import BookRepository
+from src.repositories.user_repostory import UserRepository
+from src.routes.book_routes import get_book_service  # para overridear los servicios
+from src.routes.user_routes import get_user_service
+from src.services.book_service import BookService
+from src.services.user_service import UserService
 
 # Fixture anyio_backend: soporte async para pytest-anyio
 @pytest.fixture(scope="session")
 def anyio_backend():
-    # Necesario para que pytest soporte async correctamente
-    return "asyncio"
+    # Necesario para que pytest soporte async correctamente.
+    # Con uvloop instalado (no existe en Windows) el event loop es el de libuv:
+    # misma API, menos overhead por await en los tests con Motor/httpx.
+    return ("asyncio", {"use_uvloop": uvloop is not None})
 
 # Fixture test_mongo_uri: decide a qué Mongo se conectan los tests
 @pytest.fixture(scope="session")
@@ -52,13 +64,18 @@ def test_mongo_uri():
 # Fixture test_db_name: nombre de la DB usada en pruebas
 @pytest.fixture(scope="session")
 def test_db_name():
-    return os.getenv("DB_NAME_TEST", "my_super_library_test")
+    name = os.getenv("DB_NAME_TEST", "my_super_library_test")
+    # Con pytest-xdist (-n auto) cada worker usa su propia DB: cada test hace
+    # drop_database y no debe borrarle los datos a otro worker
+    worker = os.getenv("PYTEST_XDIST_WORKER")
+    return f"{name}_{worker}" if worker else name
 
 
 # Fixture mongo_client: crea y cierra el cliente Motor (Mongo)
 @pytest.fixture(scope="session")
 async def mongo_client(test_mongo_uri):
-    client = AsyncIOMotorClient(test_mongo_uri)
+    # Mismo cliente (pool, timeouts, compresión) que la app, apuntando a la DB de tests
+    client = get_client(test_mongo_uri)
     yield client
     client.close()
 
@@ -75,28 +92,46 @@ cada test inicia con DB vacía
 """
 @pytest.fixture(scope="function")
 async def test_db(mongo_client, test_db_name):
+    # Limpieza antes de cada test: un solo dropDatabase en vez de listar
+    # colecciones y hacer delete_many (recorrido completo) en cada una
+    await mongo_client.drop_database(test_db_name)
     db = mongo_client[test_db_name]
 
-    # Limpieza antes de cada test (simple y efectivo)
-    collections = await db.list_collection_names()
-    for col in collections:
-        await db[col].delete_many({})
+    # El drop se lleva los índices: se recrean (mismos que en producción)
+    await ensure_indexes(db)
 
     yield db
 
 
-# Fixture client: crea el AsyncClient y overridea la dependencia get_db
+# Fixture http_client: un solo AsyncClient (y ASGITransport) para toda la sesión.
+# Es stateless entre requests, así que no hace falta recrearlo en cada test.
+@pytest.fixture(scope="session")
+async def http_client():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        yield ac
+
+
+# Fixture client: overridea los servicios y devuelve el AsyncClient de la sesión
+# (en producción los servicios se crean en el lifespan, que httpx no ejecuta).
+# Los servicios sí son por test: así su cache no pasa de un test a otro.
 
 @pytest.fixture(scope="function")
-async def client(test_db):
-    async def override_get_db():
-        yield test_db
+async def client(http_client, test_db):
+    book_service = BookService(BookRepository(test_db, use_filter_hint=True))
+    user_service = UserService(UserRepository(test_db))
 
-    app.dependency_overrides[db_module.get_db] = override_get_db # Eso significa: “cada vez que un endpoint pida get_db, en tests usa otro get_db diferente”.
+    async def override_get_book_service():
+        return book_service
 
-    transport = ASGITransport(app=app)
-    async with AsyncClient(transport=transport, base_url="http://test") as ac:
-        yield ac
+    async def override_get_user_service():
+        return user_service
+
+    # Eso significa: “cada vez que un endpoint pida el servicio, en tests usa uno atado a la DB de pruebas”.
+    app.dependency_overrides[get_book_service] = override_get_book_service
+    app.dependency_overrides[get_user_service] = override_get_user_service
+
+    yield http_client
 
     app.dependency_overrides.clear()
 
@@ -106,15 +141,13 @@ async def client(test_db):
 """ 
 Pytest:
 
-crea mongo_client (1 vez por sesión)
+crea mongo_client y el AsyncClient pegado a FastAPI (1 vez por sesión)
 
 para ese test:
 
 limpia la DB
 
-hace override del get_db para usar esa DB limpia
-
-crea un AsyncClient pegado a FastAPI
+hace override de los servicios para usar esa DB limpia
 
 corre el test
 
@@ -1,6 +1,13 @@
 # tests/test_books.py
+import json
+from types import MappingProxyType
+
 import pytest
 
+from main import app
+from src.routes.book_routes import get_book_service
+from src.schemas.book import BookCreate
+
 """ 
 Importa pytest.
 
@@ -10,6 +17,15 @@ Eso permite que tus funciones async def test_...() corran bien.
 pytestmark = pytest.mark.anyio
 
 
+# Payload base válido para BookCreate: se arma una sola vez (solo lectura)
+_BASE_PAYLOAD = MappingProxyType({
+    "title": "Clean Architecture",
+    "author": "Robert C. Martin",
+    "genre": "Software",
+    "total_copies": 5,
+})
+
+
 """  
 Esto es un helper para no repetir JSON en cada test:
 
@@ -26,21 +42,25 @@ Así tus tests quedan limpios y consistentes.
 def sample_payload(**overrides):
     """
     Payload base EXACTO para BookCreate (según src/schemas/book.py).
+    Devuelve un dict nuevo: los overrides nunca tocan la base compartida.
+    """
+    return {**_BASE_PAYLOAD, **overrides}
+
+
+async def seed_books(client, *payloads):
+    """
+    Alta de varios libros en un solo POST /books/bulk (un viaje en vez de N).
     """
-    payload = {
-        "title": "Clean Architecture",
-        "author": "Robert C. Martin",
-        "genre": "Software",
-        "total_copies": 5,
-    }
-    payload.update(overrides)
-    return payload
+    res = await client.post("/books/bulk", json=list(payloads))
+    assert res.status_code == 201, res.text
+    return res.json()
 
 
 async def test_list_books_empty(client):
     res = await client.get("/books")
     assert res.status_code == 200
-    assert res.json() == []
+    # Cuerpo fijo: se compara en bytes (dump_json compacto), sin parsear
+    assert res.content == b"[]"
 
 
 async def test_create_book_returns_bookread(client):
@@ -75,8 +95,11 @@ async def test_get_book_by_id(client):
 
 
 async def test_list_books_with_filters(client):
-    await client.post("/books", json=sample_payload(title="Book A", author="Author 1", genre="Fantasy", total_copies=1))
-    await client.post("/books", json=sample_payload(title="Book B", author="Author 2", genre="Sci-Fi", total_copies=2))
+    await seed_books(
+        client,
+        sample_payload(title="Book A", author="Author 1", genre="Fantasy", total_copies=1),
+        sample_payload(title="Book B", author="Author 2", genre="Sci-Fi", total_copies=2),
+    )
 
     # title exacto
     r1 = await client.get("/books", params={"title": "Book A"})
@@ -115,6 +138,30 @@ async def test_update_book_patch(client):
     assert updated["total_copies"] == 10
 
 
+async def test_update_book_empty_patch_returns_current(client):
+    created_res = await client.post("/books", json=sample_payload(title="Unchanged"))
+    assert created_res.status_code == 201, created_res.text
+    created = created_res.json()
+
+    patch_res = await client.patch(f"/books/{created['id']}", json={})
+    assert patch_res.status_code == 200, patch_res.text
+    assert patch_res.json() == created
+
+    missing_res = await client.patch("/books/000000000000000000000000", json={})
+    assert missing_res.status_code == 404
+
+
+async def test_update_book_explicit_null_returns_422(client):
+    # null explícito en PATCH: 422, sin tocar el libro ni su clave de duplicados
+    created = (await client.post("/books", json=sample_payload(title="T", author="A"))).json()
+
+    for field in ("title", "author", "genre", "total_copies"):
+        res = await client.patch(f"/books/{created['id']}", json={field: None})
+        assert res.status_code == 422, res.text
+
+    assert (await client.get(f"/books/{created['id']}")).json() == created
+
+
 async def test_delete_book(client):
     created_res = await client.post("/books", json=sample_payload(title="To Delete"))
     assert created_res.status_code == 201, created_res.text
@@ -141,3 +188,171 @@ async def test_update_book_total_copies_negative_returns_422(client):
     # En update, total_copies < 0 también debe disparar 422 por validación Pydantic
     patch_res = await client.patch(f"/books/{book_id}", json={"total_copies": -5})
     assert patch_res.status_code == 422
+
+
+async def test_list_books_cursor_pagination(client):
+    await seed_books(client, *(sample_payload(title=f"Book {i}") for i in range(3)))
+
+    # Primera página: llena, así que trae el cursor en el header
+    r1 = await client.get("/books", params={"limit": 2})
+    assert r1.status_code == 200, r1.text
+    page1 = r1.json()
+    assert [b["title"] for b in page1] == ["Book 0", "Book 1"]
+    cursor = r1.headers["X-Next-Cursor"]
+    assert cursor == page1[-1]["id"]
+
+    # Segunda página a partir del cursor: incompleta, sin cursor
+    r2 = await client.get("/books", params={"limit": 2, "after_id": cursor})
+    assert r2.status_code == 200, r2.text
+    assert [b["title"] for b in r2.json()] == ["Book 2"]
+    assert "X-Next-Cursor" not in r2.headers
+
+
+async def test_list_books_invalid_cursor_returns_422(client):
+    res = await client.get("/books", params={"after_id": "not-an-id"})
+    assert res.status_code == 422
+
+
+async def test_list_books_page_invalid_cursor_skips_count(client, monkeypatch):
+    # El cursor se valida antes de lanzar el count en paralelo
+    service = await app.dependency_overrides[get_book_service]()
+    counts = []
+
+    async def spy_count(*args, **kwargs):
+        counts.append(args)
+        return 0
+
+    monkeypatch.setattr(service._repo._collection, "count_documents", spy_count)
+
+    res = await client.get("/books/page", params={"after_id": "not-an-id"})
+    assert res.status_code == 422
+    assert counts == []
+
+
+async def test_stream_books_ndjson(client):
+    await seed_books(client, sample_payload(title="Book A"), sample_payload(title="Book B"))
+
+    res = await client.get("/books/stream")
+    assert res.status_code == 200, res.text
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert [b["title"] for b in lines] == ["Book A", "Book B"]
+
+
+async def test_create_books_bulk(client):
+    payload = [sample_payload(title="Bulk A"), sample_payload(title="Bulk B")]
+    res = await client.post("/books/bulk", json=payload)
+    assert res.status_code == 201, res.text
+    created = res.json()
+    assert [b["title"] for b in created] == ["Bulk A", "Bulk B"]
+    assert all(b["id"] for b in created)
+
+    listed = (await client.get("/books")).json()
+    assert {b["id"] for b in listed} == {b["id"] for b in created}
+
+
+async def test_create_books_bulk_duplicate_returns_409(client):
+    await client.post("/books", json=sample_payload(title="Existing"))
+
+    res = await client.post("/books/bulk", json=[sample_payload(title="New"), sample_payload(title="Existing")])
+    assert res.status_code == 409, res.text
+
+
+async def test_list_books_page_returns_items_and_total(client):
+    await seed_books(
+        client,
+        *(sample_payload(title=f"Book {i}", genre="Fantasy") for i in range(3)),
+        sample_payload(title="Other", genre="Sci-Fi"),
+    )
+
+    res = await client.get("/books/page", params={"genre": "Fantasy", "limit": 2})
+    assert res.status_code == 200, res.text
+    data = res.json()
+
+    assert data["total"] == 3
+    assert [b["title"] for b in data["items"]] == ["Book 0", "Book 1"]
+    assert data["next_cursor"] == data["items"][-1]["id"]
+
+    res = await client.get("/books/page", params={"genre": "Fantasy", "limit": 2, "after_id": data["next_cursor"]})
+    assert res.status_code == 200, res.text
+    data = res.json()
+    assert [b["title"] for b in data["items"]] == ["Book 2"]
+    assert data["next_cursor"] is None
+
+
+async def test_list_books_cache_is_invalidated_on_write(client):
+    # La primera respuesta (vacía) queda cacheada...
+    assert (await client.get("/books")).json() == []
+
+    created = (await client.post("/books", json=sample_payload(title="Fresh"))).json()
+
+    # ...pero el alta la invalida
+    listed = (await client.get("/books")).json()
+    assert [b["id"] for b in listed] == [created["id"]]
+
+    await client.patch(f"/books/{created['id']}", json={"title": "Renamed"})
+    assert [b["title"] for b in (await client.get("/books")).json()] == ["Renamed"]
+
+    await client.delete(f"/books/{created['id']}")
+    assert (await client.get("/books")).json() == []
+
+
+async def test_list_books_repeated_call_is_served_from_cache(client, monkeypatch):
+    # El mismo listado dos veces: el repositorio se consulta una sola vez
+    service = await app.dependency_overrides[get_book_service]()
+    original = service._repo.list_books
+    calls = []
+
+    async def spy_list_books(**kwargs):
+        calls.append(kwargs)
+        return await original(**kwargs)
+
+    monkeypatch.setattr(service._repo, "list_books", spy_list_books)
+
+    for _ in range(2):
+        assert (await client.get("/books", params={"genre": "Sci-Fi"})).status_code == 200
+    assert len(calls) == 1
+
+    # Otros parámetros son otra clave del cache
+    await client.get("/books", params={"genre": "Novel"})
+    assert len(calls) == 2
+
+
+async def test_list_books_write_during_list_is_not_cached(client, monkeypatch):
+    # Un alta entre que arranca y termina el listado: ese resultado (ya viejo)
+    # no se guarda, y el siguiente listado vuelve al repositorio.
+    service = await app.dependency_overrides[get_book_service]()
+    original = service._repo.list_books
+    calls = []
+
+    async def racing_list_books(**kwargs):
+        books = await original(**kwargs)
+        if not calls:
+            await service.create_book(BookCreate(**sample_payload(title="Concurrent")))
+        calls.append(kwargs)
+        return books
+
+    monkeypatch.setattr(service._repo, "list_books", racing_list_books)
+
+    assert (await client.get("/books")).json() == []
+    listed = (await client.get("/books")).json()
+    assert len(calls) == 2
+    assert [b["title"] for b in listed] == ["Concurrent"]
+
+
+async def test_create_book_duplicate_returns_409(client):
+    res = await client.post("/books", json=sample_payload(title="Dune", author="Frank Herbert"))
+    assert res.status_code == 201, res.text
+
+    # Mismo título y autor, distinto formato: sigue siendo duplicado
+    res = await client.post("/books", json=sample_payload(title="  DUNE ", author="frank herbert"))
+    assert res.status_code == 409, res.text
+
+
+async def test_update_book_into_duplicate_returns_409(client):
+    await client.post("/books", json=sample_payload(title="Taken"))
+    other = (await client.post("/books", json=sample_payload(title="Free"))).json()
+
+    res = await client.patch(f"/books/{other['id']}", json={"title": "taken"})
+    assert res.status_code == 409, res.text
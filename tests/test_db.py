@@ -0,0 +1,146 @@
+# tests/test_db.py
+import pytest
+
+from src.db.db import (
+    BOOKS_GENRE_INDEX,
+    BOOKS_UNIQUE_INDEX,
+    check_unique_indexes,
+    ensure_indexes,
+    use_index_hints,
+)
+
+# Tests del setup de la base (índices, chequeos de arranque), no de endpoints
+pytestmark = pytest.mark.anyio
+
+
+async def test_check_unique_indexes_fails_fast_when_missing(test_db):
+    """
+    Con CREATE_INDEXES=false el arranque verifica los índices únicos: si falta
+    alguno, RuntimeError (sin ellos no hay regla de duplicados).
+    """
+    await check_unique_indexes(test_db)
+
+    await test_db["users"].drop_index("email_1")
+    with pytest.raises(RuntimeError, match="users.email_1"):
+        await check_unique_indexes(test_db)
+
+
+async def test_index_hints_only_when_filter_index_exists(test_db):
+    """
+    El hint de list_books se activa solo si books_genre_id_idx existe: forzar un
+    índice inexistente haría fallar cada listado filtrado por genre.
+    """
+    assert await use_index_hints(test_db) is True
+
+    await test_db["books"].drop_index(BOOKS_GENRE_INDEX)
+    assert await use_index_hints(test_db) is False
+
+
+async def test_books_indexes_cover_list_filters(test_db):
+    """
+    ensure_indexes deja un índice para cada filtro de list_books (genre,
+    author, title) y el único de duplicados sobre los campos normalizados.
+    """
+    info = await test_db["books"].index_information()
+    keys = {tuple(field for field, _ in index["key"]): index for index in info.values()}
+
+    assert ("genre", "author", "title") in keys
+    assert ("genre", "_id") in keys
+    assert ("author", "_id") in keys
+    assert ("title",) in keys
+    assert keys[("title_norm", "author_norm")].get("unique") is True
+    assert "partialFilterExpression" not in keys[("title_norm", "author_norm")]
+
+
+async def test_ensure_indexes_backfills_legacy_books(client, test_db):
+    """
+    Libros de antes del índice único (sin *_norm, con el índice parcial viejo):
+    ensure_indexes completa los *_norm y recrea el índice completo. Así un alta
+    repetida da 409 y renombrar dos libros de autores distintos no choca.
+    """
+    books = test_db["books"]
+    await books.drop_index(BOOKS_UNIQUE_INDEX)
+    await books.create_index(
+        [("title_norm", 1), ("author_norm", 1)],
+        unique=True,
+        name=BOOKS_UNIQUE_INDEX,
+        partialFilterExpression={"title_norm": {"$type": "string"}},
+    )
+    legacy = [
+        {"title": "Dune", "author": "Frank Herbert", "genre": "Sci-Fi", "total_copies": 1},
+        {"title": "Emma", "author": "Jane Austen", "genre": "Novel", "total_copies": 1},
+    ]
+    ids = (await books.insert_many(legacy)).inserted_ids
+
+    await ensure_indexes(test_db)
+
+    info = (await books.index_information())[BOOKS_UNIQUE_INDEX]
+    assert "partialFilterExpression" not in info
+    doc = await books.find_one({"_id": ids[0]})
+    assert (doc["title_norm"], doc["author_norm"]) == ("dune", "frank herbert")
+
+    res = await client.post("/books", json={"title": " DUNE", "author": "frank herbert", "genre": "Sci-Fi", "total_copies": 1})
+    assert res.status_code == 409, res.text
+
+    for oid in ids:
+        res = await client.patch(f"/books/{oid}", json={"title": "Same Title"})
+        assert res.status_code == 200, res.text
+
+
+async def _make_unique_index_partial(books):
+    """Deja books_title_author_uniq como lo creaban versiones anteriores (parcial)."""
+    await books.drop_index(BOOKS_UNIQUE_INDEX)
+    await books.create_index(
+        [("title_norm", 1), ("author_norm", 1)],
+        unique=True,
+        name=BOOKS_UNIQUE_INDEX,
+        partialFilterExpression={"title_norm": {"$type": "string"}},
+    )
+
+
+async def test_ensure_indexes_skips_backfill_when_index_is_complete(test_db):
+    """
+    Con el índice completo ya creado, arrancar no recorre books: un documento
+    sin *_norm (insertado a mano) no se toca.
+    """
+    books = test_db["books"]
+    oid = (await books.insert_one({"title": "Dune", "author": "Frank Herbert"})).inserted_id
+
+    await ensure_indexes(test_db)
+
+    assert "title_norm" not in await books.find_one({"_id": oid})
+
+
+async def test_ensure_indexes_tolerates_legacy_null_fields(test_db):
+    """
+    Libros viejos con title null o sin author (el PATCH los permitía) no rompen
+    el arranque: se normaliza solo lo que es str.
+    """
+    books = test_db["books"]
+    await _make_unique_index_partial(books)
+    ids = (await books.insert_many([
+        {"title": None, "author": "Frank Herbert"},
+        {"title": "Emma"},
+    ])).inserted_ids
+
+    await ensure_indexes(test_db)
+
+    first, second = [await books.find_one({"_id": oid}) for oid in ids]
+    assert first["author_norm"] == "frank herbert" and "title_norm" not in first
+    assert second["title_norm"] == "emma" and "author_norm" not in second
+
+
+async def test_ensure_indexes_reports_legacy_duplicates(test_db):
+    """
+    Libros viejos que solo difieren en mayúsculas chocan en el índice completo:
+    el arranque falla con un RuntimeError que nombra la clave repetida.
+    """
+    books = test_db["books"]
+    await _make_unique_index_partial(books)
+    await books.insert_many([
+        {"title": "Dune", "author": "Frank Herbert"},
+        {"title": "DUNE ", "author": "frank herbert"},
+    ])
+
+    with pytest.raises(RuntimeError, match="dune.*frank herbert"):
+        await ensure_indexes(test_db)
@@ -12,3 +12,31 @@ response schema
 validaciones de errores (404/409/422)
  """
 
+
+import inspect
+
+from fastapi.routing import APIRoute
+
+from main import app
+
+
+def _iter_dependants(dependant):
+    yield dependant
+    for sub in dependant.dependencies:
+        yield from _iter_dependants(sub)
+
+
+def test_no_endpoint_or_dependency_runs_in_threadpool():
+    """
+    Con Motor todo el IO es asyncio: cualquier endpoint o dependencia 'def'
+    haría que FastAPI lo mande al threadpool en cada request.
+    """
+    sync_calls = [
+        f"{route.path}: {dep.call.__name__}"
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for dep in _iter_dependants(route.dependant)
+        if dep.call is not None and not inspect.iscoroutinefunction(dep.call)
+    ]
+    assert sync_calls == []
+
@@ -1,22 +1,65 @@
 # tests/test_users.py
+from types import MappingProxyType
+
 import pytest
+from pydantic import ValidationError
+
+from main import app
+from src.repositories.user_repostory import UserRepository
+from src.routes.user_routes import get_user_service
+from src.schemas.users import UserCreate, UserRead, UserUpdate
 
 pytestmark = pytest.mark.anyio
 
 
+# Payload base válido para UserCreate: se arma una sola vez (solo lectura)
+_BASE_PAYLOAD = MappingProxyType({
+    "first_name": "Testing User",
+    "last_name": "Test lastname",
+    "email": "just_test@test.com",
+    "password": "123456789",
+    "role": "user",
+})
+
+# UserRead esperado para el payload base (sin el id, que lo genera Mongo)
+EXPECTED_USER_READ = {
+    "first_name": "Testing User",
+    "last_name": "Test lastname",
+    "email": "just_test@test.com",
+    "role": "user",
+    "full_name": "Testing User Test lastname",
+}
+FORBIDDEN_USER_FIELDS = frozenset({"password", "hashed_password"})
+
+
 def sample_payload(**overrides):
     """
     Payload base EXACTO para UserCreate (según src/schemas/users.py).
+    Devuelve un dict nuevo: los overrides nunca tocan la base compartida.
+    """
+    return {**_BASE_PAYLOAD, **overrides}
+
+
+async def seed_users(client, *payloads):
+    """
+    Alta de varios usuarios en un solo POST /users/bulk (un viaje en vez de N).
     """
-    payload = {
-        "first_name": "Testing User",
-        "last_name": "Test lastname",
-        "email": "just_test@test.com",
-        "password": "123456789",
-        "role": "user",
-    }
-    payload.update(overrides)
-    return payload
+    res = await client.post("/users/bulk", json=list(payloads))
+    assert res.status_code == 201, res.text
+    return res.json()
+
+
+@pytest.fixture
+async def existing_user(client, test_db):
+    """
+    ID de un usuario ya guardado para los tests que solo necesitan uno.
+    Se inserta directo por el repositorio (sin el POST /users de ida y vuelta);
+    depende de client para que la DB ya esté limpia y los overrides puestos.
+    """
+    user = await UserRepository(test_db).create_user(
+        UserCreate(**sample_payload(email="existing@test.com"))
+    )
+    return user.id
 
 
 async def test_list_users_empty(client):
@@ -26,7 +69,8 @@ async def test_list_users_empty(client):
     """
     res = await client.get("/users")
     assert res.status_code == 200, res.text
-    assert res.json() == []
+    # Cuerpo fijo: se compara en bytes (dump_json compacto), sin parsear
+    assert res.content == b"[]"
 
 
 async def test_create_user_returns_userread(client):
@@ -38,15 +82,75 @@ async def test_create_user_returns_userread(client):
 
     data = res.json()
 
-    assert "id" in data and isinstance(data["id"], str) and data["id"]
-    assert data["first_name"] == "Testing User"
-    assert data["last_name"] == "Test lastname"
-    assert data["email"] == "just_test@test.com"
-    assert data["role"] == "user"
+    assert isinstance(data.get("id"), str) and data["id"]
+    assert {k: data.get(k) for k in EXPECTED_USER_READ} == EXPECTED_USER_READ
 
     # Seguridad: no debe devolver password (ni hash)
-    assert "password" not in data
-    assert "hashed_password" not in data
+    assert FORBIDDEN_USER_FIELDS.isdisjoint(data)
+
+
+async def test_create_user_duplicate_email_returns_409(client):
+    """
+    El email es único (sin importar mayúsculas): el segundo alta debe dar 409.
+    """
+    first = await client.post("/users", json=sample_payload(email="dup@test.com"))
+    assert first.status_code == 201, first.text
+
+    res = await client.post("/users", json=sample_payload(email="DUP@test.com"))
+    assert res.status_code == 409, res.text
+
+
+async def test_update_user_email_conflicts_return_409(client):
+    """
+    PATCH con el email de otro usuario -> 409 (lo rechaza el índice único);
+    re-enviar el email propio no es conflicto.
+    """
+    await client.post("/users", json=sample_payload(email="taken@test.com"))
+    created = await client.post("/users", json=sample_payload(email="mine@test.com"))
+    user_id = created.json()["id"]
+
+    res = await client.patch(f"/users/{user_id}", json={"email": "Taken@test.com"})
+    assert res.status_code == 409, res.text
+
+    res = await client.patch(f"/users/{user_id}", json={"email": "mine@test.com"})
+    assert res.status_code == 200, res.text
+
+    # El email nuevo se guarda normalizado
+    res = await client.patch(f"/users/{user_id}", json={"email": "  Other@Test.com"})
+    assert res.status_code == 200, res.text
+    assert res.json()["email"] == "other@test.com"
+
+
+async def test_user_reads_project_only_userread_fields(test_db, monkeypatch):
+    """
+    get_user_by_id y list_users le piden a Mongo solo los campos de UserRead:
+    el password guardado nunca sale de la base.
+    """
+    assert UserRepository._USER_PROJECTION.keys() == UserRead.model_fields.keys() - {"id"}
+    assert "password" not in UserRepository._USER_PROJECTION
+
+    repo = UserRepository(test_db)
+    user = await repo.create_user(UserCreate(**sample_payload()))
+
+    collection = repo._collection
+    find_one, find = collection.find_one, collection.find
+    projections = []
+
+    async def spy_find_one(*args, **kwargs):
+        projections.append(kwargs.get("projection"))
+        return await find_one(*args, **kwargs)
+
+    def spy_find(*args, **kwargs):
+        projections.append(kwargs.get("projection"))
+        return find(*args, **kwargs)
+
+    monkeypatch.setattr(collection, "find_one", spy_find_one)
+    monkeypatch.setattr(collection, "find", spy_find)
+
+    await repo.get_user_by_id(user.id)
+    await repo.list_users()
+
+    assert projections == [UserRepository._USER_PROJECTION] * 2
 
 
 async def test_get_user_by_id(client):
@@ -72,8 +176,11 @@ async def test_list_users_with_email_filter(client):
     """
     GET /users?email=... debe filtrar por email exacto (según tu router).
     """
-    await client.post("/users", json=sample_payload(email="a@test.com", first_name="A"))
-    await client.post("/users", json=sample_payload(email="b@test.com", first_name="B"))
+    await seed_users(
+        client,
+        sample_payload(email="a@test.com", first_name="A"),
+        sample_payload(email="b@test.com", first_name="B"),
+    )
 
     res = await client.get("/users", params={"email": "b@test.com"})
     assert res.status_code == 200, res.text
@@ -101,6 +208,57 @@ async def test_get_user_by_email_route(client):
     assert "hashed_password" not in data
 
 
+async def test_user_reads_repeated_calls_are_served_from_cache(client, monkeypatch):
+    """
+    list_users y get_user_by_email repetidos (mismos parámetros) no vuelven a
+    consultar el repositorio: la segunda respuesta sale del cache.
+    """
+    await client.post("/users", json=sample_payload(email="cached@test.com"))
+    service = await app.dependency_overrides[get_user_service]()
+    calls = []
+
+    def spy(name):
+        original = getattr(service._repo, name)
+
+        async def wrapper(*args, **kwargs):
+            calls.append(name)
+            return await original(*args, **kwargs)
+
+        monkeypatch.setattr(service._repo, name, wrapper)
+
+    spy("list_users")
+    spy("get_user_by_email")
+
+    for _ in range(2):
+        assert (await client.get("/users")).status_code == 200
+        assert (await client.get("/users/by-email/CACHED@test.com")).status_code == 200
+    assert calls == ["list_users", "get_user_by_email"]
+
+
+async def test_list_users_write_during_list_is_not_cached(client, monkeypatch):
+    """
+    Un alta entre que arranca y termina list_users: ese resultado (ya viejo)
+    no se guarda y el siguiente listado vuelve al repositorio.
+    """
+    service = await app.dependency_overrides[get_user_service]()
+    original = service._repo.list_users
+    calls = []
+
+    async def racing_list_users(**kwargs):
+        users = await original(**kwargs)
+        if not calls:
+            await service.create_user(UserCreate(**sample_payload(email="concurrent@test.com")))
+        calls.append(kwargs)
+        return users
+
+    monkeypatch.setattr(service._repo, "list_users", racing_list_users)
+
+    assert (await client.get("/users")).json() == []
+    listed = (await client.get("/users")).json()
+    assert len(calls) == 2
+    assert [u["email"] for u in listed] == ["concurrent@test.com"]
+
+
 async def test_update_user_patch(client):
     """
     PATCH /users/{user_id} debe actualizar campos permitidos por UserUpdate.
@@ -127,52 +285,106 @@ async def test_update_user_patch(client):
     assert "hashed_password" not in updated
 
 
-async def test_delete_user(client):
+async def test_update_user_empty_patch_returns_current(client):
     """
-    DELETE /users/{user_id} debe devolver 204 y luego el GET debe fallar (404 o 410).
+    PATCH sin campos: devuelve el usuario actual (una sola lectura), 404 si
+    no existe y 422 si el ID es inválido.
     """
-    created_res = await client.post("/users", json=sample_payload(email="del@test.com"))
-    assert created_res.status_code == 201, created_res.text
-    user_id = created_res.json()["id"]
+    created = (await client.post("/users", json=sample_payload(email="same@test.com"))).json()
+
+    res = await client.patch(f"/users/{created['id']}", json={})
+    assert res.status_code == 200, res.text
+    assert res.json() == created
 
-    del_res = await client.delete(f"/users/{user_id}")
+    res = await client.patch("/users/000000000000000000000000", json={})
+    assert res.status_code == 404
+
+    res = await client.patch("/users/not-an-id", json={})
+    assert res.status_code == 422
+
+
+async def test_delete_user(client, existing_user):
+    """
+    DELETE /users/{user_id} debe devolver 204 y luego el GET debe fallar (404 o 410).
+    """
+    del_res = await client.delete(f"/users/{existing_user}")
     assert del_res.status_code == 204, del_res.text
 
-    get_res = await client.get(f"/users/{user_id}")
+    get_res = await client.get(f"/users/{existing_user}")
     assert get_res.status_code in (404, 410), get_res.text
 
 
-# =========================
-# Validaciones (422)
-# =========================
-
-async def test_create_user_missing_required_field_returns_422(client):
+async def test_create_users_bulk(client):
     """
-    Si falta un campo requerido (ej: email), Pydantic debe responder 422.
+    POST /users/bulk crea todos los usuarios del lote (emails normalizados).
     """
-    payload = sample_payload()
-    payload.pop("email")
+    payload = [sample_payload(email="Bulk1@test.com"), sample_payload(email="bulk2@test.com")]
+    res = await client.post("/users/bulk", json=payload)
+    assert res.status_code == 201, res.text
+    data = res.json()
 
-    res = await client.post("/users", json=payload)
-    assert res.status_code == 422, res.text
+    assert [u["email"] for u in data] == ["bulk1@test.com", "bulk2@test.com"]
+    assert all(u["id"] for u in data)
+    assert all("password" not in u for u in data)
+
+    # Un segundo lote con un email ya existente debe dar conflicto
+    res = await client.post("/users/bulk", json=[sample_payload(email="bulk1@test.com")])
+    assert res.status_code == 409, res.text
 
 
-async def test_create_user_invalid_email_returns_422(client):
+async def test_update_and_delete_missing_user_return_404(client):
     """
-    Si tu schema usa EmailStr para email, debe fallar con 422.
-    (Si no usas EmailStr, este test fallará y lo ajustas o lo eliminas.)
+    PATCH / DELETE sobre un ID válido pero inexistente deben dar 404.
     """
-    res = await client.post("/users", json=sample_payload(email="not-an-email"))
+    missing_id = "000000000000000000000000"
+
+    res = await client.patch(f"/users/{missing_id}", json={"first_name": "X"})
+    assert res.status_code == 404, res.text
+
+    res = await client.delete(f"/users/{missing_id}")
+    assert res.status_code == 404, res.text
+
+    res = await client.delete("/users/not-an-id")
     assert res.status_code == 422, res.text
 
+# =========================
+# Validaciones (422)
+# =========================
 
-async def test_update_user_invalid_email_returns_422(client):
+async def test_create_user_invalid_payload_returns_422(client):
     """
-    PATCH con email inválido debería dar 422 si UserUpdate valida EmailStr.
+    Smoke test HTTP: un payload que UserCreate rechaza sale como 422.
+    Los casos de validación en sí se prueban directo contra los schemas (abajo).
     """
-    created_res = await client.post("/users", json=sample_payload(email="valid@test.com"))
-    assert created_res.status_code == 201, created_res.text
-    user_id = created_res.json()["id"]
-
-    res = await client.patch(f"/users/{user_id}", json={"email": "bad-email"})
+    res = await client.post("/users", json=sample_payload(email="not-an-email"))
     assert res.status_code == 422, res.text
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        # falta un campo requerido (email)
+        {k: v for k, v in _BASE_PAYLOAD.items() if k != "email"},
+        # email inválido (el schema usa EmailStr)
+        sample_payload(email="not-an-email"),
+        # password más corto que el mínimo (6)
+        sample_payload(password="123"),
+    ],
+    ids=["missing_email", "invalid_email", "short_password"],
+)
+def test_user_create_schema_rejects_invalid_payload(payload):
+    with pytest.raises(ValidationError):
+        UserCreate(**payload)
+
+
+def test_user_update_schema_rejects_invalid_email():
+    with pytest.raises(ValidationError):
+        UserUpdate(email="bad-email")
+
+
+@pytest.mark.parametrize("field", ["first_name", "last_name", "email", "role", "password"])
+def test_user_update_schema_rejects_explicit_null(field):
+    with pytest.raises(ValidationError):
+        UserUpdate(**{field: None})
+    # omitido sí es válido: no se modifica
+    assert UserUpdate().model_dump(exclude_unset=True) == {}